@@ -1,11 +1,29 @@
 # nextbike.py
-import requests
-from typing import List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from datetime import datetime, timezone
 
+from .. import http_client
+from ..cache import cached, get_cache_backend
+from ..config import get_env
+
 NEXTBIKE_API_URL = "https://api.nextbike.net/maps/nextbike-live.json"
 POLAND_COUNTRY_CODE = "pl"
 HEADERS = {"User-Agent": "GeoChatNextbikeModule/1.0"}
+SNAPSHOT_TTL_SECONDS = 60
+
+# Nazwy krajów na wypadek, gdyby API nie zwróciło "country_name"
+COUNTRY_NAMES: Dict[str, str] = {
+    "pl": "Poland",
+    "de": "Germany",
+    "cz": "Czech Republic",
+    "sk": "Slovakia",
+    "at": "Austria",
+    "lt": "Lithuania",
+    "ua": "Ukraine",
+}
 
 
 # --- Słownik ID -> czytelna nazwa (do uzupełnienia/edytowania) ---
@@ -27,11 +45,53 @@ BIKE_TYPE_MAP: Dict[str, str] = {
 }
 
 
-def get_nextbike_data() -> dict:
-    """Pobiera surowe dane o stacjach Nextbike tylko dla Polski (countries=pl)."""
-    params = {"countries": POLAND_COUNTRY_CODE}
+def get_configured_countries() -> List[str]:
+    """Kody krajów obsługiwanych shardów – NEXTBIKE_COUNTRIES, np. "pl,de,cz" (domyślnie "pl")."""
+    raw = get_env("NEXTBIKE_COUNTRIES") or POLAND_COUNTRY_CODE
+    codes = [c.strip().lower() for c in raw.split(",") if c.strip()]
+    return list(dict.fromkeys(codes)) or [POLAND_COUNTRY_CODE]
+
+
+def get_shard_ttl(country_code: str = POLAND_COUNTRY_CODE) -> float:
+    """
+    Co ile sekund odświeżany jest shard danego kraju.
+    NEXTBIKE_REFRESH_SECONDS, np. "de:120,cz:300"; domyślnie SNAPSHOT_TTL_SECONDS.
+    """
+    raw = get_env("NEXTBIKE_REFRESH_SECONDS") or ""
+    for item in raw.split(","):
+        code, _, seconds = item.partition(":")
+        if code.strip().lower() == country_code and seconds.strip():
+            return float(seconds)
+    return SNAPSHOT_TTL_SECONDS
+
+
+def get_feed_ttl(country_code: str = POLAND_COUNTRY_CODE) -> float:
+    """
+    Czas życia surowego feedu we współdzielonym cache: połowa TTL shardu. Snapshot shardu
+    ma więc najwyżej 1,5 x TTL, a przy kolejnym odświeżeniu ten sam worker
+    nie dostaje z cache feedu, który już raz przeliczył.
+    """
+    return get_shard_ttl(country_code) / 2
+
+
+def get_nextbike_data(country_code: str = POLAND_COUNTRY_CODE) -> dict:
+    """
+    Pobiera surowe dane o stacjach Nextbike dla jednego kraju (domyślnie countries=pl).
+
+    Feed trafia do cache tylko przy współdzielonym backendzie (SQLite), żeby
+    workery nie pobierały go osobno. W cache per-proces nie byłoby trafień
+    (shard pyta o feed rzadziej, niż ten wygasa), a kodowanie kilku MB
+    danych przy każdym odświeżeniu to czysty koszt.
+    """
+    if get_cache_backend().shared:
+        return _get_shared_nextbike_data(country_code)
+    return _fetch_nextbike_data(country_code)
+
+
+def _fetch_nextbike_data(country_code: str) -> dict:
+    params = {"countries": country_code}
     try:
-        resp = requests.get(NEXTBIKE_API_URL, params=params, headers=HEADERS, timeout=15)
+        resp = http_client.get(NEXTBIKE_API_URL, params=params, headers=HEADERS, timeout=15)
         resp.raise_for_status()
         return resp.json()
     except Exception as e:
@@ -39,6 +99,9 @@ def get_nextbike_data() -> dict:
         raise RuntimeError(f"Nextbike API error: {e}")
 
 
+_get_shared_nextbike_data = cached(ttl=get_feed_ttl, namespace=f"{__name__}.get_nextbike_data")(_fetch_nextbike_data)
+
+
 def extract_available_bike_types(place: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
     Ekstrahuje dostępne typy rowerów i ich liczbę na stacji,
@@ -67,16 +130,21 @@ def extract_available_bike_types(place: Dict[str, Any]) -> List[Dict[str, Any]]:
     return result
 
 
-def normalize_nextbike_data() -> List[Dict[str, Any]]:
-    """Normalizuje dane stacji Nextbike do wymaganego formatu JSON."""
-    raw = get_nextbike_data()
+def normalize_nextbike_data(country_code: str = POLAND_COUNTRY_CODE) -> List[Dict[str, Any]]:
+    """
+    Normalizuje dane stacji Nextbike jednego kraju do wymaganego formatu JSON.
+    Kraj stacji bierzemy z danych systemu (country_name), nie zakładamy Polski.
+    """
+    raw = get_nextbike_data(country_code)
     results: List[Dict[str, Any]] = []
 
     ts = datetime.now(timezone.utc).isoformat()
-    TRUE_COUNTRY = "Poland"
+    default_country = COUNTRY_NAMES.get(country_code, country_code.upper())
 
     for country in raw.get("countries", []):
-        system_brand = country.get("name") or "Nextbike Polska"
+        # "countries" w API to w praktyce systemy/marki, każdy z własnym krajem
+        system_brand = country.get("name") or "Nextbike"
+        country_name = country.get("country_name") or default_country
 
         for city in country.get("cities", []):
             city_name = city.get("name")
@@ -94,7 +162,8 @@ def normalize_nextbike_data() -> List[Dict[str, Any]]:
                         "lon": place.get("lng"),
                         "name": place.get("name"),
                         "city": city_name,
-                        "country": TRUE_COUNTRY
+                        "country": country_name,
+                        "country_code": country_code
                     },
                     "timestamp": ts,
                     "metrics": {
@@ -110,15 +179,258 @@ def normalize_nextbike_data() -> List[Dict[str, Any]]:
     return results
 
 
+# --- Snapshot stacji i zagregowane statystyki (per miasto / per typ roweru) ---
+class StationAggregates:
+    """
+    Agregaty liczone przyrostowo z kolejnych snapshotów stacji.
+
+    Przy każdej zmianie snapshotu odejmujemy wkład stacji usuniętych lub
+    zmienionych i dodajemy wkład nowych, więc koszt aktualizacji zależy
+    od liczby zmienionych stacji. Gotowe podsumowanie jest budowane raz
+    na snapshot, a odczyt to tylko zwrócenie referencji.
+    """
+
+    def __init__(self) -> None:
+        # wkład stacji trzymamy osobno dla każdego shardu (kraju)
+        self._contributions: Dict[str, Dict[Any, Tuple]] = {}
+        # miasta kluczowane (kod kraju, miasto) – te same nazwy w różnych krajach się nie mieszają
+        self._cities: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        # kraje kluczowane kodem shardu ("pl"), nazwa w polu "name"
+        self._countries: Dict[str, Dict[str, Any]] = {}
+        self._totals: Dict[str, Any] = self._empty_bucket()
+        self._lock = threading.Lock()
+        self._summary: Dict[str, Any] = self._build_summary(None)
+
+    @staticmethod
+    def _empty_bucket() -> Dict[str, Any]:
+        return {"stations": 0, "bikes_available": 0, "docks_available": 0, "bike_types": {}}
+
+    @staticmethod
+    def _station_key(station: Dict[str, Any]) -> Any:
+        loc = station["location"]
+        spot_id = station["metrics"].get("spot_id")
+        if spot_id is not None:
+            return spot_id
+        return (loc.get("city"), loc.get("name"), loc.get("lat"), loc.get("lon"))
+
+    @staticmethod
+    def _station_contribution(station: Dict[str, Any]) -> Tuple:
+        metrics = station["metrics"]
+        bike_types = tuple(
+            (t["type_name"], t["available_count"])
+            for t in metrics.get("available_bike_types", [])
+        )
+        loc = station["location"]
+        return (
+            loc.get("country_code") or "",
+            loc.get("country") or "",
+            loc.get("city") or "",
+            int(metrics.get("bikes_available") or 0),
+            int(metrics.get("docks_available") or 0),
+            bike_types,
+        )
+
+    def _apply(self, contribution: Tuple, sign: int) -> None:
+        country_code, country_name, city, bikes, docks, bike_types = contribution
+        bucket = self._cities.get((country_code, city))
+        if bucket is None:
+            bucket = self._cities[(country_code, city)] = self._empty_bucket()
+        country_bucket = self._countries.get(country_code)
+        if country_bucket is None:
+            country_bucket = self._countries[country_code] = {"name": country_name, **self._empty_bucket()}
+
+        for target in (bucket, country_bucket, self._totals):
+            target["stations"] += sign
+            target["bikes_available"] += sign * bikes
+            target["docks_available"] += sign * docks
+            types = target["bike_types"]
+            for type_name, count in bike_types:
+                new_count = types.get(type_name, 0) + sign * count
+                if new_count:
+                    types[type_name] = new_count
+                else:
+                    types.pop(type_name, None)
+
+        if bucket["stations"] <= 0:
+            del self._cities[(country_code, city)]
+        if country_bucket["stations"] <= 0:
+            del self._countries[country_code]
+
+    def update(self, stations: List[Dict[str, Any]], timestamp: str, scope: str = POLAND_COUNTRY_CODE) -> bool:
+        """
+        Nakłada nowy snapshot jednego shardu (`scope`). Pozostałe shardy
+        nie są dotykane. Zwraca True, jeśli agregaty się zmieniły.
+        """
+        new_contributions = {
+            self._station_key(station): self._station_contribution(station)
+            for station in stations
+        }
+
+        with self._lock:
+            old_contributions = self._contributions.get(scope, {})
+            changed = False
+            for key, old in old_contributions.items():
+                new = new_contributions.get(key)
+                if new != old:
+                    self._apply(old, -1)
+                    changed = True
+            for key, new in new_contributions.items():
+                if old_contributions.get(key) != new:
+                    self._apply(new, +1)
+                    changed = True
+
+            self._contributions[scope] = new_contributions
+            if changed or self._summary["timestamp"] is None:
+                self._summary = self._build_summary(timestamp)
+        return changed
+
+    def _build_summary(self, timestamp: Optional[str]) -> Dict[str, Any]:
+        def copy_bucket(bucket: Dict[str, Any]) -> Dict[str, Any]:
+            return {**bucket, "bike_types": dict(bucket["bike_types"])}
+
+        countries = {
+            code: {**copy_bucket(b), "cities": {}}
+            for code, b in self._countries.items()
+        }
+        for (code, city), b in self._cities.items():
+            countries[code]["cities"][city] = copy_bucket(b)
+
+        return {
+            "category": "bikeshare",
+            "source": "nextbike",
+            "timestamp": timestamp,
+            "totals": copy_bucket(self._totals),
+            "countries": countries,
+        }
+
+    def summary(self, city: Optional[str] = None, country: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Zwraca podsumowanie całości, jednego kraju (kod shardu, np. "pl")
+        albo jednego miasta (None, jeśli brak takich stacji). Miasto bez
+        kraju jest szukane we wszystkich krajach; gdy występuje w kilku,
+        rzucamy ValueError.
+        """
+        summary = self._summary
+        if city is None and country is None:
+            return summary
+
+        if city is None:
+            bucket = summary["countries"].get(country)
+            if bucket is None:
+                return None
+            return {
+                "category": "bikeshare",
+                "source": "nextbike",
+                "timestamp": summary["timestamp"],
+                "country": country,
+                **bucket,
+            }
+
+        if country is None:
+            matches = [code for code, b in summary["countries"].items() if city in b["cities"]]
+            if len(matches) > 1:
+                raise ValueError(f"Miasto {city} występuje w kilku krajach ({', '.join(matches)}), podaj country")
+            if not matches:
+                return None
+            country = matches[0]
+
+        bucket = summary["countries"].get(country, {}).get("cities", {}).get(city)
+        if bucket is None:
+            return None
+        return {
+            "category": "bikeshare",
+            "source": "nextbike",
+            "timestamp": summary["timestamp"],
+            "country": country,
+            "city": city,
+            **bucket,
+        }
+
+
+class NextbikeShard:
+    """
+    Snapshot stacji jednego kraju, odświeżany niezależnie od innych
+    co get_shard_ttl(country_code) sekund.
+    """
+
+    def __init__(self, country_code: str) -> None:
+        self.country_code = country_code
+        self.ttl = get_shard_ttl(country_code)
+        self._stations: List[Dict[str, Any]] = []
+        self._fetched_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get_stations(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            if self._fetched_at is None or now - self._fetched_at >= self.ttl:
+                stations = normalize_nextbike_data(self.country_code)
+                ts = stations[0]["timestamp"] if stations else datetime.now(timezone.utc).isoformat()
+                _aggregates.update(stations, ts, scope=self.country_code)
+                self._stations = stations
+                self._fetched_at = now
+            return self._stations
+
+
+_aggregates = StationAggregates()
+_shards: Dict[str, NextbikeShard] = {}
+_shards_lock = threading.Lock()
+
+
+def _get_shards(countries: Optional[Iterable[str]] = None) -> List[NextbikeShard]:
+    configured = get_configured_countries()
+    if countries is None:
+        codes = configured
+    else:
+        codes = list(dict.fromkeys(c.strip().lower() for c in countries if c.strip()))
+        if not codes:
+            raise ValueError(f"Nie wybrano żadnego kraju (dostępne: {', '.join(configured)})")
+        unknown = [c for c in codes if c not in configured]
+        if unknown:
+            raise ValueError(f"Nieobsługiwane kraje: {', '.join(unknown)} (dostępne: {', '.join(configured)})")
+
+    with _shards_lock:
+        for code in codes:
+            if code not in _shards:
+                _shards[code] = NextbikeShard(code)
+        return [_shards[code] for code in codes]
+
+
+def get_nextbike_snapshot(countries: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Zwraca znormalizowane stacje z bieżących snapshotów wybranych krajów
+    (domyślnie wszystkich z NEXTBIKE_COUNTRIES). Nieaktualne shardy są
+    pobierane równolegle, a wraz z nimi aktualizowane agregaty.
+    """
+    shards = _get_shards(countries)
+    if len(shards) == 1:
+        return shards[0].get_stations()
+
+    with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+        parts = list(pool.map(lambda shard: shard.get_stations(), shards))
+    return [station for part in parts for station in part]
+
+
+def get_nextbike_summary(city: Optional[str] = None, country: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Zwraca prekomputowane agregaty (stacje, wolne rowery, wolne miejsca,
+    rowery per typ) łącznie, per kraj i per miasto – albo dla jednego
+    miasta / kraju (kod kraju jak w NEXTBIKE_COUNTRIES, np. "pl").
+    Z filtrem kraju odświeżany jest tylko shard tego kraju.
+    """
+    get_nextbike_snapshot([country] if country else None)
+    return _aggregates.summary(city=city, country=country)
+
+
 # --- Pomocniczne: funkcja do zebrania wszystkich unikalnych ID typów rowerów ---
 def gather_unique_bike_type_ids() -> List[str]:
     """
-    Pobiera live dane i zwraca listę unikalnych ID typów rowerów (jako str).
-    Użyteczne do wypełnienia BIKE_TYPE_MAP.
+    Pobiera live dane (wszystkie skonfigurowane kraje) i zwraca listę
+    unikalnych ID typów rowerów (jako str). Użyteczne do wypełnienia BIKE_TYPE_MAP.
     """
-    raw = get_nextbike_data()
     ids = set()
-    for country in raw.get("countries", []):
+    countries = [c for code in get_configured_countries() for c in get_nextbike_data(code).get("countries", [])]
+    for country in countries:
         for city in country.get("cities", []):
             for place in city.get("places", []):
                 bt = place.get("bike_types")
@@ -1,23 +1,51 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
-from typing import List, Dict, Any
+from fastapi import FastAPI, Query
+from typing import List, Dict, Any, Optional
 
-from .nextbike import normalize_nextbike_data
+from ..responses import FastJSONResponse, CompressionMiddleware
+from .nextbike import get_nextbike_snapshot, get_nextbike_summary
 
-app = FastAPI(title="Nextbike API")
+app = FastAPI(title="Nextbike API", default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
 
 @app.get("/nextbike", response_model=List[Dict[str, Any]])
-def get_nextbike():
+def get_nextbike(
+    countries: Optional[str] = Query(None, description="Kody krajów po przecinku, np. 'pl,de' (domyślnie wszystkie skonfigurowane)"),
+):
     """
-    Pobiera aktualne dane o wszystkich stacjach Nextbike w Polsce.
+    Pobiera aktualne dane o stacjach Nextbike w wybranych krajach.
     Zwraca ujednoliconą listę stacji, dostępnych rowerów/miejsc oraz ich typów.
     """
     try:
-        data = normalize_nextbike_data()
-        return JSONResponse(content=data)
+        data = get_nextbike_snapshot(countries.split(",") if countries else None)
+        return FastJSONResponse(content=data)
+    except ValueError as e:
+        return FastJSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={"error": str(e), "message": "Nie udało się pobrać danych z Nextbike API."},
-        )
\ No newline at end of file
+        )
+
+
+@app.get("/nextbike/summary")
+def get_nextbike_summary_endpoint(
+    city: Optional[str] = Query(None, description="Nazwa miasta, np. 'Wrocław'"),
+    country: Optional[str] = Query(None, description="Kod kraju, np. 'pl'"),
+):
+    """
+    Zwraca prekomputowane agregaty Nextbike: liczbę stacji, wolnych rowerów,
+    wolnych miejsc i rowerów per typ – łącznie, dla każdego kraju i miasta.
+    """
+    try:
+        data = get_nextbike_summary(city=city, country=country.strip().lower() if country else None)
+    except ValueError as e:
+        return FastJSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        return FastJSONResponse(
+            status_code=500,
+            content={"error": str(e), "message": "Nie udało się pobrać danych z Nextbike API."},
+        )
+    if data is None:
+        return FastJSONResponse(status_code=404, content={"error": f"Brak stacji dla: {city or country}"})
+    return FastJSONResponse(content=data)
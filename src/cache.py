@@ -0,0 +1,274 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+import orjson
+
+from .config import get_env
+
+# Returned by backends on a cache miss (None is a valid cached value).
+MISS = object()
+
+DEFAULT_MAX_ENTRIES = 10_000
+COMPRESS_MIN_BYTES = 1024
+
+_RAW = b"j"
+_COMPRESSED = b"z"
+
+
+def encode_value(value: Any) -> bytes:
+    """
+    Encode a JSON-like value as compact bytes: orjson, plus zlib for values
+    of COMPRESS_MIN_BYTES and more. The first byte marks the format.
+    """
+    data = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return _COMPRESSED + zlib.compress(data, 6)
+    return _RAW + data
+
+
+def decode_value(blob: bytes) -> Any:
+    marker, data = blob[:1], blob[1:]
+    if marker == _COMPRESSED:
+        data = zlib.decompress(data)
+    return orjson.loads(data)
+
+
+class CacheBackend(ABC):
+    """
+    Interface of a cache backend. Keys are strings scoped by a namespace
+    (usually the cached function); `ttl` is given in seconds.
+    `shared` tells whether all worker processes see the same entries;
+    `path` is the file backing a shared backend (lock files are created
+    next to it), or None.
+    """
+
+    shared = False
+    path: Optional[str] = None
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Any:
+        """Return the cached value or MISS."""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        """Store `value` for `ttl` seconds."""
+
+    @abstractmethod
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Drop all entries of `namespace`, or everything when it is None."""
+
+
+class MemoryLRUCache(CacheBackend):
+    """
+    In-process LRU cache with TTLs, capped at `max_entries` entries.
+
+    Values are kept as encode_value bytes, like in SQLiteCache, so every
+    read returns a fresh copy and callers cannot mutate the cached entry.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Tuple[str, str], Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None:
+                return MISS
+            if entry[0] <= time.time():
+                del self._data[(namespace, key)]
+                return MISS
+            self._data.move_to_end((namespace, key))
+            blob = entry[1]
+        return decode_value(blob)
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        blob = encode_value(value)
+        with self._lock:
+            self._data[(namespace, key)] = (time.time() + ttl, blob)
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+                return
+            for k in [k for k in self._data if k[0] == namespace]:
+                del self._data[k]
+
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk cache shared by all worker processes on the host.
+
+    SQLite in WAL mode lets readers and a writer work concurrently across
+    processes, and the database is memory-mapped for reads. Values are
+    stored with encode_value. `max_entries` is enforced on every write by
+    dropping the rows closest to expiry (expired rows first); all expired
+    rows are purged every `_PURGE_EVERY` writes.
+    """
+
+    shared = True
+    _PURGE_EVERY = 100
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES, mmap_size: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " value BLOB NOT NULL,"
+            " PRIMARY KEY (namespace, key)"
+            ") WITHOUT ROWID"
+        )
+        self._connection().execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # one connection per thread and per process (connections must not cross fork())
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, namespace: str, key: str) -> Any:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time()),
+        ).fetchone()
+        if row is None:
+            return MISS
+        return decode_value(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, expires_at, value) VALUES (?, ?, ?, ?)",
+            (namespace, key, time.time() + ttl, encode_value(value)),
+        )
+        self._writes += 1
+        if self._writes % self._PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self._enforce_cap(conn)
+
+    def _enforce_cap(self, conn: sqlite3.Connection) -> None:
+        # counted on the small expires_at index; other workers' rows are included
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                "DELETE FROM cache WHERE (namespace, key) IN "
+                "(SELECT namespace, key FROM cache ORDER BY expires_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        if namespace is None:
+            self._connection().execute("DELETE FROM cache")
+        else:
+            self._connection().execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+
+_backend: Optional[CacheBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_cache_backend() -> CacheBackend:
+    """
+    Return the process-wide cache backend, created on first use from:
+    - CACHE_BACKEND: "memory" (default) or "sqlite"
+    - CACHE_PATH: SQLite file (default: geo_chat_cache.sqlite3 in the temp dir)
+    - CACHE_MAX_ENTRIES: size cap (default DEFAULT_MAX_ENTRIES)
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                kind = (get_env("CACHE_BACKEND", "memory") or "memory").strip().lower()
+                max_entries = int(get_env("CACHE_MAX_ENTRIES") or DEFAULT_MAX_ENTRIES)
+                if kind == "sqlite":
+                    path = get_env("CACHE_PATH") or os.path.join(tempfile.gettempdir(), "geo_chat_cache.sqlite3")
+                    _backend = SQLiteCache(path, max_entries=max_entries)
+                elif kind == "memory":
+                    _backend = MemoryLRUCache(max_entries=max_entries)
+                else:
+                    raise RuntimeError(f"Unknown CACHE_BACKEND: {kind}")
+    return _backend
+
+
+def set_cache_backend(backend: CacheBackend) -> None:
+    """Replace the process-wide cache backend (e.g. in tooling or tests)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def cached(ttl: Union[float, Callable[..., float]], namespace: Optional[str] = None) -> Callable:
+    """
+    Cache the results of an upstream fetch function for `ttl` seconds
+    in the configured cache backend. `ttl` may also be a function called
+    with the same arguments, for a per-key lifetime.
+
+    The key is built from the call arguments (their repr), the namespace
+    defaults to the function's module and name. Values must be JSON-like
+    so that every backend can store them.
+    The decorated function gets two extra attributes:
+    - `refresh(*args, **kwargs)` – always call upstream and store the result
+      (used by the warm-up scheduler to keep hot entries fresh)
+    - `cache_clear()` – drop all entries of this function
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        ns = namespace or f"{fn.__module__}.{fn.__qualname__}"
+        ttl_for = ttl if callable(ttl) else (lambda *args, **kwargs: ttl)
+
+        def make_key(args: Tuple, kwargs: Dict[str, Any]) -> str:
+            return repr(args + tuple(sorted(kwargs.items())))
+
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            backend = get_cache_backend()
+            key = make_key(args, kwargs)
+            value = backend.get(ns, key)
+            if value is not MISS:
+                return value
+            value = fn(*args, **kwargs)
+            backend.set(ns, key, value, ttl_for(*args, **kwargs))
+            return value
+
+        def refresh(*args: Any, **kwargs: Any) -> Any:
+            value = fn(*args, **kwargs)
+            get_cache_backend().set(ns, make_key(args, kwargs), value, ttl_for(*args, **kwargs))
+            return value
+
+        def cache_clear() -> None:
+            get_cache_backend().clear(ns)
+
+        wrapper.refresh = refresh
+        wrapper.cache_clear = cache_clear
+        wrapper.ttl = ttl
+        return wrapper
+
+    return decorator
@@ -0,0 +1,37 @@
+import os
+from typing import Optional
+
+_dotenv_loaded = False
+
+
+def _load_env() -> None:
+    """Load the .env file once, on first access to the configuration."""
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    _dotenv_loaded = True
+
+
+def get_env(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Return an environment variable (after loading .env) or `default`."""
+    _load_env()
+    return os.getenv(name, default)
+
+
+def require_env(name: str) -> str:
+    """Return a required environment variable or raise RuntimeError."""
+    value = get_env(name)
+    if not value:
+        raise RuntimeError(f"Missing {name}")
+    return value
+
+
+def get_openweather_api_key() -> str:
+    return require_env("OPENWEATHER_API_KEY")
+
+
+def get_tomtom_api_key() -> str:
+    return require_env("TOMTOM_API_KEY")
@@ -1,13 +1,46 @@
-import requests
-from typing import Dict, Any
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
 from datetime import datetime
 from urllib.parse import quote
 
+from .. import http_client
+from ..cache import cached, get_cache_backend
+
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
 NFZ_BASE_URL = "https://api.nfz.gov.pl/app-itl-api/queues"
 
 HEADERS = {"User-Agent": "NFZDoctorFinder/1.1"}
 
+GEOCODE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+NFZ_CACHE_TTL_SECONDS = 3600
+NFZ_BATCH_WORKERS = 4
+
+# Nominatim usage policy: max 1 zapytanie/s na całą aplikację
+NOMINATIM_MIN_INTERVAL_SECONDS = 1.1
+
+
+def _nominatim_lock_path() -> str:
+    """
+    Plik limitera Nominatim: obok współdzielonego cache, a przy cache
+    per-proces w katalogu tymczasowym – w obu przypadkach wspólny dla
+    wszystkich workerów na hoście.
+    """
+    backend = get_cache_backend()
+    base = backend.path or os.path.join(tempfile.gettempdir(), "geo_chat")
+    return f"{base}.nominatim.lock"
+
+
+_nominatim_limiter = http_client.RateLimiter(NOMINATIM_MIN_INTERVAL_SECONDS, path=_nominatim_lock_path)
+
+# limity /doctors/batch: liczba punktów i różnych lokalizacji do geokodowania
+# (każda niezcache'owana to ~1 s czekania na Nominatim)
+BATCH_MAX_POINTS = 500
+BATCH_MAX_LOCATIONS = 50
+# ~100 m – bliskie punkty dzielą jeden reverse geocoding
+BATCH_COORD_DECIMALS = 3
+
 PROVINCE_CODES = {
     "DOLNOŚLĄSKIE": "01",
     "KUJAWSKO-POMORSKIE": "02",
@@ -28,6 +61,7 @@ PROVINCE_CODES = {
 }
 
 
+@cached(ttl=GEOCODE_CACHE_TTL_SECONDS)
 def get_location_from_coords(lat: float, lon: float) -> Dict[str, str]:
     """Reverse geocoding – zamiana współrzędnych na miasto i województwo"""
     params = {
@@ -37,7 +71,8 @@ def get_location_from_coords(lat: float, lon: float) -> Dict[str, str]:
         "addressdetails": 1,
         "accept-language": "pl",
     }
-    resp = requests.get(NOMINATIM_URL, params=params, headers=HEADERS, timeout=10)
+    _nominatim_limiter.wait()
+    resp = http_client.get(NOMINATIM_URL, params=params, headers=HEADERS, timeout=10)
     resp.raise_for_status()
     data = resp.json()
 
@@ -56,20 +91,28 @@ def get_location_from_coords(lat: float, lon: float) -> Dict[str, str]:
     return {"city": city.upper(), "province": province, "province_code": province_code}
 
 
-def get_doctor_availability(lat: float, lon: float, service_name: str, urgent: bool = False) -> Dict[str, Any]:
-    """Pobiera 10 najbliższych terminów leczenia z NFZ."""
-    location = get_location_from_coords(lat, lon)
+def normalize_service_name(service_name: str) -> str:
+    """
+    Ujednolica nazwę świadczenia (NFZ nie rozróżnia wielkości liter), żeby
+    'kardiolog' i 'KARDIOLOG' trafiały w ten sam wpis cache.
+    """
+    return " ".join(service_name.split()).upper()
+
+
+@cached(ttl=NFZ_CACHE_TTL_SECONDS)
+def get_nfz_queues(province_code: str, city: str, service_name: str, urgent: bool = False) -> List[Dict[str, Any]]:
+    """Pobiera z NFZ 10 najbliższych terminów dla województwa i miejscowości."""
     case = 1 if urgent else 2
 
     url = (
         f"{NFZ_BASE_URL}?case={case}"
-        f"&province={location['province_code']}"
-        f"&locality={quote(location['city'].capitalize())}"
+        f"&province={province_code}"
+        f"&locality={quote(city.capitalize())}"
         f"&benefit={quote(service_name)}"
         f"&format=json"
     )
 
-    resp = requests.get(url, headers=HEADERS, timeout=15)
+    resp = http_client.get(url, headers=HEADERS, timeout=15)
     resp.raise_for_status()
     data = resp.json()
 
@@ -92,6 +135,12 @@ def get_doctor_availability(lat: float, lon: float, service_name: str, urgent: b
             "date_updated": stats.get("update"),
         })
 
+    return results
+
+
+def _availability_response(
+    lat: float, lon: float, service_name: str, urgent: bool, location: Dict[str, str], results: List[Dict[str, Any]]
+) -> Dict[str, Any]:
     return {
         "query": {
             "service": service_name,
@@ -106,21 +155,113 @@ def get_doctor_availability(lat: float, lon: float, service_name: str, urgent: b
         "results": results,
     }
 
-def get_coordinates_from_address(address: str) -> Dict[str, float]:
-    """Geokodowanie adresu na współrzędne."""
-    if not address:
-        return {"lat": None, "lon": None}
+
+def get_doctor_availability(lat: float, lon: float, service_name: str, urgent: bool = False) -> Dict[str, Any]:
+    """Pobiera 10 najbliższych terminów leczenia z NFZ."""
+    location = get_location_from_coords(lat, lon)
+    results = get_nfz_queues(
+        location["province_code"], location["city"], normalize_service_name(service_name), bool(urgent)
+    )
+    return _availability_response(lat, lon, service_name, urgent, location, results)
+
+
+def get_doctor_availability_batch(
+    points: List[Dict[str, Any]], service_name: str, urgent: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Terminy NFZ dla wielu lokalizacji naraz.
+
+    Punkty są grupowane po (województwo, miejscowość) z reverse geocodingu;
+    dla każdej grupy wykonujemy jedno zapytanie do NFZ (równolegle), a wynik
+    trafia do wszystkich punktów z grupy. Koszt rośnie więc z liczbą różnych
+    miejscowości, a nie użytkowników. Wyniki są w kolejności wejścia;
+    punkt, dla którego się nie udało, dostaje pole "error".
+
+    Współrzędne są zaokrąglane do BATCH_COORD_DECIMALS miejsc przed
+    geokodowaniem. Zbyt duży batch (BATCH_MAX_POINTS punktów lub
+    BATCH_MAX_LOCATIONS różnych lokalizacji) kończy się ValueError.
+    """
+    if len(points) > BATCH_MAX_POINTS:
+        raise ValueError(f"Za dużo punktów: {len(points)} (maks. {BATCH_MAX_POINTS})")
+
+    def key(point: Dict[str, Any]) -> Tuple[float, float]:
+        return (round(point["lat"], BATCH_COORD_DECIMALS), round(point["lon"], BATCH_COORD_DECIMALS))
+
+    unique_coords = list(dict.fromkeys(key(p) for p in points))
+    if len(unique_coords) > BATCH_MAX_LOCATIONS:
+        raise ValueError(f"Za dużo różnych lokalizacji: {len(unique_coords)} (maks. {BATCH_MAX_LOCATIONS})")
+
+    # 1) reverse geocoding – raz na zaokrąglone współrzędne, po kolei;
+    #    odstępy między zapytaniami do Nominatim (we wszystkich procesach) pilnuje _nominatim_limiter
+    locations: Dict[Tuple[float, float], Any] = {}
+    for coords in unique_coords:
+        try:
+            locations[coords] = get_location_from_coords(*coords)
+        except Exception as e:
+            locations[coords] = e
+
+    # 2) jedno zapytanie NFZ na grupę (województwo, miejscowość)
+    groups = {
+        (loc["province_code"], loc["city"])
+        for loc in locations.values()
+        if not isinstance(loc, Exception)
+    }
+
+    def fetch(group: Tuple[str, str]) -> Any:
+        try:
+            return get_nfz_queues(group[0], group[1], normalize_service_name(service_name), bool(urgent))
+        except Exception as e:
+            return e
+
+    ordered_groups = list(groups)
+    with ThreadPoolExecutor(max_workers=max(1, min(NFZ_BATCH_WORKERS, len(ordered_groups)))) as pool:
+        queues = dict(zip(ordered_groups, pool.map(fetch, ordered_groups)))
+
+    # 3) rozdzielenie wyników z powrotem na punkty
+    output: List[Dict[str, Any]] = []
+    for point in points:
+        lat, lon = point["lat"], point["lon"]
+        location = locations[key(point)]
+        results = (
+            location if isinstance(location, Exception)
+            else queues[(location["province_code"], location["city"])]
+        )
+        if isinstance(results, Exception):
+            output.append({
+                "query": {"service": service_name, "urgent": urgent, "lat": lat, "lon": lon},
+                "error": str(results),
+            })
+            continue
+        output.append(_availability_response(lat, lon, service_name, urgent, location, results))
+
+    return output
+
+
+@cached(ttl=GEOCODE_CACHE_TTL_SECONDS)
+def _geocode_address(address: str) -> Dict[str, float]:
     params = {
         "q": address,
         "format": "json",
         "limit": 1
     }
-    resp = requests.get("https://nominatim.openstreetmap.org/search", params=params, headers=HEADERS, timeout=10)
-    if resp.status_code != 200 or not resp.json():
+    _nominatim_limiter.wait()
+    resp = http_client.get("https://nominatim.openstreetmap.org/search", params=params, headers=HEADERS, timeout=10)
+    # błędy HTTP nie trafiają do cache – tylko poprawne odpowiedzi
+    resp.raise_for_status()
+    if not resp.json():
         return {"lat": None, "lon": None}
     data = resp.json()[0]
     return {"lat": float(data["lat"]), "lon": float(data["lon"])}
 
+def get_coordinates_from_address(address: str) -> Dict[str, float]:
+    """Geokodowanie adresu na współrzędne."""
+    if not address:
+        return {"lat": None, "lon": None}
+    try:
+        return _geocode_address(address)
+    except Exception:
+        return {"lat": None, "lon": None}
+
 def get_doctor_coordinates(lat: float, lon: float, service_name: str, urgent: bool = False) -> Dict[str, Any]:
     """Zwraca współrzędne placówek i daty kolejek (tylko przyszłe lub dzisiejsze)."""
     data = get_doctor_availability(lat, lon, service_name, urgent)
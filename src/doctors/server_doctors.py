@@ -1,11 +1,34 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Query
-from fastapi.responses import JSONResponse
-from typing import Optional
+from pydantic import BaseModel
+from typing import List, Optional
+
+from ..responses import FastJSONResponse, CompressionMiddleware
+from ..warmup import doctors_task, start_warmup
+from .doctors_availability import (
+    get_doctor_availability,
+    get_doctor_availability_batch,
+    get_doctor_coordinates,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    scheduler = start_warmup([doctors_task()])
+    yield
+    if scheduler:
+        scheduler.stop()
+
+
+app = FastAPI(title="NFZ Doctors Availability API", lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
 
-from .doctors_availability import get_doctor_availability
-from .doctors_availability import get_doctor_availability, get_doctor_coordinates
+class Point(BaseModel):
+    lat: float
+    lon: float
 
-app = FastAPI(title="NFZ Doctors Availability API")
 
 @app.get("/doctors")
 def get_doctors(
@@ -16,9 +39,9 @@ def get_doctors(
 ):
     try:
         data = get_doctor_availability(lat, lon, service_name, urgent)
-        return JSONResponse(content=data)
+        return FastJSONResponse(content=data)
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        return FastJSONResponse(status_code=500, content={"error": str(e)})
 
 @app.get("/doctorsCoordinates")
 def get_doctors_coordinates(
@@ -29,6 +52,25 @@ def get_doctors_coordinates(
 ):
     try:
         data = get_doctor_coordinates(lat, lon, service_name, urgent)
-        return JSONResponse(content=data)
+        return FastJSONResponse(content=data)
+    except Exception as e:
+        return FastJSONResponse(status_code=500, content={"error": str(e)})
+
+
+@app.post("/doctors/batch")
+def get_doctors_batch(
+    points: List[Point],
+    service_name: str = Query(..., description="Nazwa poradni np. 'KARDIOLOG'"),
+    urgent: Optional[bool] = Query(False, description="Tryb PILNY jeśli True, domyślnie STABILNY"),
+):
+    """
+    Terminy NFZ dla wielu lokalizacji. Body: lista {lat, lon}.
+    Jedno zapytanie do NFZ na każdą różną miejscowość.
+    """
+    try:
+        data = get_doctor_availability_batch([p.dict() for p in points], service_name, urgent)
+        return FastJSONResponse(content=data)
+    except ValueError as e:
+        return FastJSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
\ No newline at end of file
+        return FastJSONResponse(status_code=500, content={"error": str(e)})
@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Union
+
+_session = None
+
+
+def get_session():
+    """
+    Return a shared requests.Session.
+
+    `requests` is imported on first use rather than at module import time,
+    so the apps boot without paying for it, and the session keeps
+    connections to upstream APIs alive between calls.
+    """
+    global _session
+    if _session is None:
+        import requests
+
+        _session = requests.Session()
+    return _session
+
+
+def get(url: str, **kwargs: Any):
+    """Perform a GET request using the shared session."""
+    return get_session().get(url, **kwargs)
+
+
+def _lock_file(handle, lock: bool) -> None:
+    """Take (blocking) or release an exclusive lock on an open file."""
+    if os.name == "nt":
+        import msvcrt
+
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK if lock else msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX if lock else fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """
+    Spaces calls at least `min_interval` seconds apart.
+
+    `wait()` blocks until the next call is allowed; it is thread-safe, so
+    request handlers and warm-up threads calling one provider share a budget.
+    With `path` (a file, or a callable returning one on first use) the time
+    of the last call is kept in that file under an exclusive lock, so the
+    budget is shared by all processes on the host, e.g. uvicorn workers.
+    """
+
+    def __init__(self, min_interval: float, path: Union[str, Callable[[], str], None] = None):
+        self.min_interval = min_interval
+        self.path = path
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            if self.path is None:
+                now = time.monotonic()
+                if self._next > now:
+                    time.sleep(self._next - now)
+                    now = self._next
+                self._next = now + self.min_interval
+                return
+
+            if callable(self.path):
+                self.path = self.path()
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, "r+b") as handle:
+                _lock_file(handle, True)
+                try:
+                    handle.seek(0)
+                    try:
+                        last = float(handle.read() or 0)
+                    except ValueError:
+                        last = 0.0
+                    delay = last + self.min_interval - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    handle.seek(0)
+                    handle.truncate()
+                    handle.write(repr(time.time()).encode("ascii"))
+                    handle.flush()
+                finally:
+                    _lock_file(handle, False)
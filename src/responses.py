@@ -0,0 +1,99 @@
+import gzip
+from typing import Any
+
+import brotli
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with orjson instead of the stdlib json module."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses negotiated via Accept-Encoding.
+
+    Brotli is preferred over gzip when the client accepts both. Bodies
+    smaller than `minimum_size` and responses that already carry a
+    Content-Encoding are passed through unchanged.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._negotiate(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        body_parts = []
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            await self._send_response(send, start_message, b"".join(body_parts), encoding)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _negotiate(scope) -> str | None:
+        accept = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1").lower()
+                break
+
+        offered = set()
+        for item in accept.split(","):
+            token, _, params = item.strip().partition(";")
+            if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+                continue
+            offered.add(token.strip())
+
+        if "br" in offered:
+            return "br"
+        if "gzip" in offered:
+            return "gzip"
+        return None
+
+    async def _send_response(self, send, start_message, body: bytes, encoding: str) -> None:
+        headers = list(start_message.get("headers", []))
+        already_encoded = any(key == b"content-encoding" for key, _ in headers)
+
+        if len(body) >= self.minimum_size and not already_encoded:
+            if encoding == "br":
+                body = brotli.compress(body, quality=self.brotli_quality)
+            else:
+                body = gzip.compress(body, compresslevel=self.gzip_level)
+
+            headers = [(k, v) for k, v in headers if k != b"content-length"]
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+            headers.append((b"vary", b"Accept-Encoding"))
+            start_message = {**start_message, "headers": headers}
+
+        await send(start_message)
+        await send({"type": "http.response.body", "body": body})
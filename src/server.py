@@ -1,17 +1,33 @@
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any, Optional
 
 from fastapi import FastAPI, Query
-from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
+from .config import get_openweather_api_key
+from .responses import FastJSONResponse, CompressionMiddleware
+from .warmup import environment_task, forecast_task, start_warmup
 from .weather_environment import (
     normalize_environment_data,
     get_environment_for_points,
     get_hourly_environment_timeseries,
+    get_environment_grid,
+    GridUpstreamError,
 )
 
 
-app = FastAPI(title="Geo Chat – Environment API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast on a misconfigured worker, but only when the app is served.
+    get_openweather_api_key()
+    scheduler = start_warmup([environment_task(), forecast_task()])
+    yield
+    if scheduler:
+        scheduler.stop()
+
+
+app = FastAPI(title="Geo Chat – Environment API", lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
 
 class Point(BaseModel):
@@ -25,30 +41,34 @@ def get_environment(
     lat: float = Query(..., description="Latitude"),
     lon: float = Query(..., description="Longitude"),
     name: Optional[str] = Query(None, description="Optional location name"),
+    include_raw: bool = Query(True, description="Include raw OpenWeather payloads"),
 ):
     """
     Get current environment data (weather + air quality) for a single point.
     """
     try:
-        data = normalize_environment_data(lat, lon, name=name)
-        return JSONResponse(content=data)
+        data = normalize_environment_data(lat, lon, name=name, include_raw=include_raw)
+        return FastJSONResponse(content=data)
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={"error": str(e)},
         )
 
 
 @app.post("/environment/batch")
-def get_environment_batch(points: List[Point]):
+def get_environment_batch(
+    points: List[Point],
+    include_raw: bool = Query(True, description="Include raw OpenWeather payloads"),
+):
     """
     Get environment data for multiple points at once.
 
     Request body: JSON array of {lat, lon, name?}
     """
     pts: List[Dict[str, Any]] = [p.dict() for p in points]
-    data = get_environment_for_points(pts)
-    return JSONResponse(content=data)
+    data = get_environment_for_points(pts, include_raw=include_raw)
+    return FastJSONResponse(content=data)
 
 
 @app.get("/environment/hourly")
@@ -65,9 +85,43 @@ def get_environment_hourly(
     """
     try:
         data = get_hourly_environment_timeseries(lat, lon, hours=hours, name=name)
-        return JSONResponse(content=data)
+        return FastJSONResponse(content=data)
+    except Exception as e:
+        return FastJSONResponse(
+            status_code=500,
+            content={"error": str(e)},
+        )
+
+
+@app.get("/environment/grid")
+def get_environment_grid_endpoint(
+    min_lat: float = Query(..., ge=-90, le=90, description="South edge of the bbox"),
+    min_lon: float = Query(..., ge=-180, le=180, description="West edge of the bbox"),
+    max_lat: float = Query(..., ge=-90, le=90, description="North edge of the bbox"),
+    max_lon: float = Query(..., ge=-180, le=180, description="East edge of the bbox"),
+    resolution: float = Query(0.05, gt=0, description="Grid spacing in degrees"),
+):
+    """
+    Get interpolated environment data on a regular grid (for heatmaps).
+
+    Upstream is sampled on a coarse lattice only; metrics are returned
+    as flat row-major arrays described by the "grid" metadata.
+    """
+    try:
+        data = get_environment_grid(min_lat, min_lon, max_lat, max_lon, resolution)
+        return FastJSONResponse(content=data)
+    except ValueError as e:
+        return FastJSONResponse(
+            status_code=400,
+            content={"error": str(e)},
+        )
+    except GridUpstreamError as e:
+        return FastJSONResponse(
+            status_code=502,
+            content={"error": str(e)},
+        )
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={"error": str(e)},
         )
@@ -1,12 +1,27 @@
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any, Optional
 
 from fastapi import FastAPI, Query
-from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
+from ..responses import FastJSONResponse, CompressionMiddleware
+from ..warmup import start_warmup, traffic_task
+from ..config import get_tomtom_api_key
 from .traffic import normalize_traffic_data, get_traffic_for_points
 
-app = FastAPI(title="Traffic API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail fast on a misconfigured worker, but only when the app is served.
+    get_tomtom_api_key()
+    scheduler = start_warmup([traffic_task()])
+    yield
+    if scheduler:
+        scheduler.stop()
+
+
+app = FastAPI(title="Traffic API", lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
 
 class Point(BaseModel):
@@ -21,9 +36,9 @@ def get_traffic(lat: float = Query(..., description="Latitude"),
                 name: Optional[str] = Query(None, description="Optional location name")):
     try:
         data = normalize_traffic_data(lat, lon, name=name)
-        return JSONResponse(content=data)
+        return FastJSONResponse(content=data)
     except Exception as e:
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=500,
             content={"error": str(e)},
         )
@@ -33,4 +48,4 @@ def get_traffic(lat: float = Query(..., description="Latitude"),
 def get_traffic_batch(points: List[Point]):
     pts: List[Dict[str, Any]] = [p.dict() for p in points]
     data = get_traffic_for_points(pts)
-    return JSONResponse(content=data)
+    return FastJSONResponse(content=data)
@@ -1,26 +1,22 @@
-import os
 from datetime import datetime, timezone
 from typing import List, Dict, Any
 
-import requests
-from dotenv import load_dotenv
-
-load_dotenv()
-
-TOMTOM_API_KEY = os.getenv("TOMTOM_API_KEY")
-if not TOMTOM_API_KEY:
-    raise RuntimeError("Missing TOMTOM_API_KEY")
+from .. import http_client
+from ..cache import cached
+from ..config import get_tomtom_api_key
 
 TRAFFIC_FLOW_URL = "https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
+TRAFFIC_CACHE_TTL_SECONDS = 120
 
 
+@cached(ttl=TRAFFIC_CACHE_TTL_SECONDS)
 def get_traffic_flow(lat: float, lon: float) -> dict:
     params = {
         "point": f"{lat},{lon}",
         "unit": "KMPH",
-        "key": TOMTOM_API_KEY,
+        "key": get_tomtom_api_key(),
     }
-    resp = requests.get(TRAFFIC_FLOW_URL, params=params, timeout=10)
+    resp = http_client.get(TRAFFIC_FLOW_URL, params=params, timeout=10)
     if resp.status_code != 200:
         raise RuntimeError(
             f"Traffic flow request failed: {resp.status_code} {resp.text}"
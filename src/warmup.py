@@ -0,0 +1,264 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from .cache import get_cache_backend
+from .config import get_env
+
+logger = logging.getLogger(__name__)
+
+# City centres with most of our traffic (same points as in main.py / main_traffic.py)
+DEFAULT_HOT_LOCATIONS: List[Dict[str, object]] = [
+    {"lat": 52.2297, "lon": 21.0122, "name": "Warsaw"},
+    {"lat": 50.0647, "lon": 19.9450, "name": "Krakow"},
+    {"lat": 51.1079, "lon": 17.0385, "name": "Wroclaw"},
+    {"lat": 53.1325, "lon": 23.1688, "name": "Bialystok"},
+]
+DEFAULT_DOCTOR_SERVICES = ["kardiolog"]
+
+# Minimal pause between two upstream calls of one warm-up task, chosen to
+# stay well inside each provider's rate limit (OpenWeather free plan:
+# 60/min shared by the environment and forecast tasks, TomTom: 5/s,
+# Nominatim usage policy: 1/s).
+OPENWEATHER_SPACING_SECONDS = 2.5
+TOMTOM_SPACING_SECONDS = 0.5
+NOMINATIM_NFZ_SPACING_SECONDS = 1.1
+
+
+@dataclass
+class WarmupTask:
+    """
+    One layer to keep warm.
+
+    `steps(location)` returns the upstream calls needed for one location;
+    they are executed one by one with `spacing` seconds in between, and the
+    whole list of locations is refreshed every `interval` seconds.
+    """
+
+    name: str
+    steps: Callable[[Dict[str, object]], List[Callable[[], object]]]
+    interval: float
+    spacing: float
+
+
+def get_hot_locations() -> List[Dict[str, object]]:
+    """
+    Hot locations from WARMUP_LOCATIONS ("Name:lat:lon;Name:lat:lon")
+    or DEFAULT_HOT_LOCATIONS when the variable is not set.
+    """
+    raw = get_env("WARMUP_LOCATIONS")
+    if not raw:
+        return list(DEFAULT_HOT_LOCATIONS)
+
+    locations = []
+    for item in raw.split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        name, lat, lon = item.rsplit(":", 2)
+        locations.append({"lat": float(lat), "lon": float(lon), "name": name.strip() or None})
+    return locations
+
+
+def get_doctor_services() -> List[str]:
+    """Services warmed for the doctors layer, from WARMUP_DOCTOR_SERVICES (comma-separated)."""
+    raw = get_env("WARMUP_DOCTOR_SERVICES")
+    if not raw:
+        return list(DEFAULT_DOCTOR_SERVICES)
+    return [s.strip() for s in raw.split(",") if s.strip()]
+
+
+def _interval(layer: str, ttl: float) -> float:
+    """
+    Refresh interval of one layer: WARMUP_<LAYER>_INTERVAL_SECONDS, then
+    WARMUP_INTERVAL_SECONDS, by default half of the layer's cache TTL.
+    Values that are not positive are ignored. Values too close to (or above)
+    the TTL are clamped to 80% of it, otherwise hot entries would expire
+    between refreshes.
+    """
+    raw = get_env(f"WARMUP_{layer.upper()}_INTERVAL_SECONDS") or get_env("WARMUP_INTERVAL_SECONDS")
+    interval = float(raw) if raw else ttl / 2
+    if interval <= 0:
+        logger.warning("Warm-up interval %ss for %s is not positive, using %ss", interval, layer, ttl / 2)
+        interval = ttl / 2
+    limit = ttl * 0.8
+    if interval > limit:
+        logger.warning("Warm-up interval %ss for %s exceeds its cache TTL, using %ss", interval, layer, limit)
+        interval = limit
+    return interval
+
+
+def environment_task() -> WarmupTask:
+    from .weather_environment import (
+        CURRENT_CACHE_TTL_SECONDS,
+        get_current_air_quality,
+        get_current_weather,
+    )
+
+    def steps(loc):
+        lat, lon = loc["lat"], loc["lon"]
+        return [
+            lambda: get_current_weather.refresh(lat, lon),
+            lambda: get_current_air_quality.refresh(lat, lon),
+        ]
+
+    return WarmupTask("environment", steps, _interval("environment", CURRENT_CACHE_TTL_SECONDS), OPENWEATHER_SPACING_SECONDS)
+
+
+def forecast_task() -> WarmupTask:
+    from .weather_environment import FORECAST_CACHE_TTL_SECONDS, get_hourly_forecast
+
+    def steps(loc):
+        lat, lon = loc["lat"], loc["lon"]
+        return [lambda: get_hourly_forecast.refresh(lat, lon)]
+
+    return WarmupTask("forecast", steps, _interval("forecast", FORECAST_CACHE_TTL_SECONDS), OPENWEATHER_SPACING_SECONDS)
+
+
+def traffic_task() -> WarmupTask:
+    from .traffic.traffic import TRAFFIC_CACHE_TTL_SECONDS, get_traffic_flow
+
+    def steps(loc):
+        lat, lon = loc["lat"], loc["lon"]
+        return [lambda: get_traffic_flow.refresh(lat, lon)]
+
+    return WarmupTask("traffic", steps, _interval("traffic", TRAFFIC_CACHE_TTL_SECONDS), TOMTOM_SPACING_SECONDS)
+
+
+def doctors_task() -> WarmupTask:
+    from .doctors.doctors_availability import (
+        NFZ_CACHE_TTL_SECONDS,
+        get_location_from_coords,
+        get_nfz_queues,
+        normalize_service_name,
+    )
+
+    # same normalisation as the request path, so warmed keys match
+    services = [normalize_service_name(s) for s in get_doctor_services()]
+
+    def steps(loc):
+        lat, lon = loc["lat"], loc["lon"]
+        location = {}
+
+        def resolve():
+            # reverse geocode is cached for days, so this rarely hits Nominatim
+            location.update(get_location_from_coords(lat, lon))
+
+        def queue(service, urgent):
+            def step():
+                if location:
+                    get_nfz_queues.refresh(location["province_code"], location["city"], service, urgent)
+            return step
+
+        return [resolve] + [queue(s, u) for s in services for u in (True, False)]
+
+    return WarmupTask("doctors", steps, _interval("doctors", NFZ_CACHE_TTL_SECONDS), NOMINATIM_NFZ_SPACING_SECONDS)
+
+
+def _try_lock(path: str):
+    """Take a non-blocking exclusive lock on `path`; returns the open file or None."""
+    handle = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+class WarmupScheduler:
+    """
+    Runs warm-up tasks in background daemon threads (one per task):
+    once at startup, then every `task.interval` seconds.
+
+    With a shared cache backend (SQLite) only one worker process runs each
+    task: the one holding a lock file next to the cache database. The
+    other workers stand by and take over if that process exits. With the
+    per-process memory backend every worker has to warm its own cache.
+    """
+
+    def __init__(self, tasks: List[WarmupTask], locations: Optional[List[Dict[str, object]]] = None):
+        self.tasks = tasks
+        self.locations = locations if locations is not None else get_hot_locations()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for task in self.tasks:
+            thread = threading.Thread(target=self._run, args=(task,), name=f"warmup-{task.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads.clear()
+
+    @staticmethod
+    def _lock_path(task: WarmupTask) -> Optional[str]:
+        backend = get_cache_backend()
+        if not backend.shared or not backend.path:
+            return None
+        return f"{backend.path}.warmup-{task.name}.lock"
+
+    def _min_interval(self, task: WarmupTask) -> float:
+        """Time one paced pass over all locations takes – the shortest interval a task can keep."""
+        return task.spacing * sum(len(task.steps(loc)) for loc in self.locations)
+
+    def _run(self, task: WarmupTask) -> None:
+        interval = task.interval
+        min_interval = self._min_interval(task)
+        if interval < min_interval:
+            logger.warning("Warm-up interval %ss for %s is shorter than one pass, using %ss", interval, task.name, min_interval)
+            interval = min_interval
+        lock_path = self._lock_path(task)
+        lock = None
+        try:
+            while not self._stop.is_set():
+                if lock_path and lock is None:
+                    lock = _try_lock(lock_path)
+                    if lock is None:
+                        # another worker runs this task; retry in case it goes away
+                        self._stop.wait(interval)
+                        continue
+                started = time.monotonic()
+                self.run_once(task)
+                self._stop.wait(max(0.0, interval - (time.monotonic() - started)))
+        finally:
+            if lock is not None:
+                lock.close()
+
+    def run_once(self, task: WarmupTask) -> None:
+        """Refresh all hot locations for one task, pacing upstream calls."""
+        for loc in self.locations:
+            for step in task.steps(loc):
+                if self._stop.is_set():
+                    return
+                try:
+                    step()
+                except Exception as e:
+                    logger.warning("Warm-up %s failed for %s: %s", task.name, loc.get("name"), e)
+                self._stop.wait(task.spacing)
+
+
+def start_warmup(tasks: List[WarmupTask]) -> Optional[WarmupScheduler]:
+    """
+    Start a scheduler for `tasks` unless disabled with WARMUP_ENABLED=0.
+    Returns the scheduler (to stop it on shutdown) or None.
+    """
+    if (get_env("WARMUP_ENABLED", "1") or "").strip().lower() in ("0", "false", "no", "off"):
+        return None
+    scheduler = WarmupScheduler(tasks)
+    scheduler.start()
+    return scheduler
@@ -1,31 +1,46 @@
-import os
+import math
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import List, Dict, Any
 
-import requests
-from dotenv import load_dotenv
-
-load_dotenv()
-
-OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
-if not OPENWEATHER_API_KEY:
-    raise RuntimeError("Missing OPENWEATHER_API_KEY")
+from . import http_client
+from .cache import cached
+from .config import get_openweather_api_key
 
 BASE_WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
 AIR_POLLUTION_URL = "https://api.openweathermap.org/data/2.5/air_pollution"
 FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"  # 5-day / 3-hour forecast
 
-
+# OpenWeather refreshes current conditions roughly every 10 minutes
+CURRENT_CACHE_TTL_SECONDS = 600
+FORECAST_CACHE_TTL_SECONDS = 1800
+
+# Grid mode: upstream is sampled only on a coarse lattice roughly matching
+# the effective resolution of OpenWeather's weather / air quality models.
+# Lattice nodes lie on multiples of the step, so overlapping or panned bboxes
+# share (cached) nodes and neighbouring tiles interpolate from the same data.
+GRID_LATTICE_STEP_DEG = 0.25
+# 16 nodes = 32 OpenWeather calls, about half of the 60/min free-plan budget;
+# larger bboxes are sampled with a multiple of GRID_LATTICE_STEP_DEG.
+GRID_MAX_LATTICE_POINTS = 16
+# Above this share of failed lattice nodes the grid is an error, not a map.
+GRID_MAX_FAILED_SHARE = 0.5
+GRID_MAX_CELLS = 40_000
+GRID_FETCH_WORKERS = 4
+GRID_METRICS = ("temperature", "humidity", "pressure", "pm25", "pm10", "aqi")
+
+
+@cached(ttl=CURRENT_CACHE_TTL_SECONDS)
 def get_current_weather(lat: float, lon: float) -> dict:
     """Fetch current weather data from OpenWeather."""
     params = {
         "lat": lat,
         "lon": lon,
-        "appid": OPENWEATHER_API_KEY,
+        "appid": get_openweather_api_key(),
         "units": "metric",
         "lang": "en",
     }
-    resp = requests.get(BASE_WEATHER_URL, params=params, timeout=10)
+    resp = http_client.get(BASE_WEATHER_URL, params=params, timeout=10)
     if resp.status_code != 200:
         raise RuntimeError(
             f"Weather request failed: {resp.status_code} {resp.text}"
@@ -33,14 +48,15 @@ def get_current_weather(lat: float, lon: float) -> dict:
     return resp.json()
 
 
+@cached(ttl=CURRENT_CACHE_TTL_SECONDS)
 def get_current_air_quality(lat: float, lon: float) -> dict:
     """Fetch current air quality data from OpenWeather."""
     params = {
         "lat": lat,
         "lon": lon,
-        "appid": OPENWEATHER_API_KEY,
+        "appid": get_openweather_api_key(),
     }
-    resp = requests.get(AIR_POLLUTION_URL, params=params, timeout=10)
+    resp = http_client.get(AIR_POLLUTION_URL, params=params, timeout=10)
     if resp.status_code != 200:
         raise RuntimeError(
             f"Air quality request failed: {resp.status_code} {resp.text}"
@@ -48,6 +64,7 @@ def get_current_air_quality(lat: float, lon: float) -> dict:
     return resp.json()
 
 
+@cached(ttl=FORECAST_CACHE_TTL_SECONDS)
 def get_hourly_forecast(lat: float, lon: float) -> dict:
     """
     Fetch weather forecast using OpenWeather 5-day / 3-hour forecast API.
@@ -56,11 +73,11 @@ def get_hourly_forecast(lat: float, lon: float) -> dict:
     params = {
         "lat": lat,
         "lon": lon,
-        "appid": OPENWEATHER_API_KEY,
+        "appid": get_openweather_api_key(),
         "units": "metric",
         "lang": "en",
     }
-    resp = requests.get(FORECAST_URL, params=params, timeout=10)
+    resp = http_client.get(FORECAST_URL, params=params, timeout=10)
     if resp.status_code != 200:
         raise RuntimeError(
             f"Forecast request failed: {resp.status_code} {resp.text}"
@@ -128,10 +145,15 @@ def get_hourly_environment_timeseries(
     return results
 
 
-def normalize_environment_data(lat: float, lon: float, name: str | None = None) -> dict:
+def normalize_environment_data(
+    lat: float, lon: float, name: str | None = None, include_raw: bool = True
+) -> dict:
     """
     Combine current weather and air quality data into a unified format
     ready for visualization on the map.
+
+    With `include_raw=False` the "raw" block (full upstream payloads)
+    is left out, which makes the response much smaller.
     """
     weather = get_current_weather(lat, lon)
     air = get_current_air_quality(lat, lon)
@@ -147,7 +169,7 @@ def normalize_environment_data(lat: float, lon: float, name: str | None = None)
     components = air_item.get("components", {})
     aqi = air_item.get("main", {}).get("aqi")
 
-    return {
+    data = {
         "category": "environment",  # weather + air quality
         "source": "openweather",
         "location": {
@@ -166,14 +188,18 @@ def normalize_environment_data(lat: float, lon: float, name: str | None = None)
             "pm10": components.get("pm10"),        # µg/m³
             "aqi": aqi,                            # 1 (good) – 5 (very bad)
         },
-        "raw": {
+    }
+    if include_raw:
+        data["raw"] = {
             "weather": weather,
             "air": air,
-        },
-    }
+        }
+    return data
 
 
-def get_environment_for_points(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def get_environment_for_points(
+    points: List[Dict[str, Any]], include_raw: bool = True
+) -> List[Dict[str, Any]]:
     """
     Fetch environment data (weather + air quality) for multiple points.
 
@@ -184,6 +210,7 @@ def get_environment_for_points(points: List[Dict[str, Any]]) -> List[Dict[str, A
     ]
 
     Output: list of normalized dictionaries (same format as normalize_environment_data).
+    `include_raw` is passed through to normalize_environment_data.
     """
     results: List[Dict[str, Any]] = []
 
@@ -192,7 +219,7 @@ def get_environment_for_points(points: List[Dict[str, Any]]) -> List[Dict[str, A
         lon = point["lon"]
         name = point.get("name")
         try:
-            data = normalize_environment_data(lat, lon, name=name)
+            data = normalize_environment_data(lat, lon, name=name, include_raw=include_raw)
             results.append(data)
         except Exception as e:
             results.append(
@@ -209,3 +236,172 @@ def get_environment_for_points(points: List[Dict[str, Any]]) -> List[Dict[str, A
             )
 
     return results
+
+
+class GridUpstreamError(RuntimeError):
+    """Too many lattice nodes could not be fetched from OpenWeather."""
+
+
+def _lattice_axis(start: float, stop: float, min_step: float, max_nodes: int):
+    """
+    Lattice nodes covering [start, stop] on multiples of GRID_LATTICE_STEP_DEG
+    (or of the smallest multiple of it not below `min_step`), coarsened until
+    there are at most `max_nodes` of them (`max_nodes` must be at least 3).
+    """
+    import numpy as np
+
+    k = max(1, math.ceil(min_step / GRID_LATTICE_STEP_DEG - 1e-9))
+    while True:
+        step = GRID_LATTICE_STEP_DEG * k
+        first = math.floor(start / step + 1e-9)
+        last = math.ceil(stop / step - 1e-9)
+        if last - first + 1 <= max_nodes:
+            # rounded, so that equal nodes give equal cache keys
+            return np.array([round(i * step, 6) for i in range(first, last + 1)])
+        k += 1
+
+
+def _bilinear(values, src_lat, src_lon, dst_lat, dst_lon):
+    """
+    Bilinear interpolation of `values` (shape: len(src_lat) x len(src_lon))
+    from a regular lattice to the regular grid given by dst_lat x dst_lon.
+
+    Missing (NaN) corners are skipped and the remaining weights are
+    renormalised, so a failed node only affects cells that depend on it;
+    a cell is NaN only when all of its corners with non-zero weight are.
+    """
+    import numpy as np
+
+    def weights(src, dst):
+        if len(src) == 1:
+            return np.zeros(len(dst), dtype=int), np.zeros(len(dst))
+        pos = (dst - src[0]) / (src[-1] - src[0]) * (len(src) - 1)
+        idx = np.clip(np.floor(pos).astype(int), 0, len(src) - 2)
+        return idx, np.clip(pos - idx, 0.0, 1.0)
+
+    i0, ty = weights(src_lat, dst_lat)
+    j0, tx = weights(src_lon, dst_lon)
+    i1 = np.minimum(i0 + 1, len(src_lat) - 1)
+    j1 = np.minimum(j0 + 1, len(src_lon) - 1)
+    ty = ty[:, None]
+    tx = tx[None, :]
+
+    corners = (
+        (values[np.ix_(i0, j0)], (1 - ty) * (1 - tx)),
+        (values[np.ix_(i0, j1)], (1 - ty) * tx),
+        (values[np.ix_(i1, j0)], ty * (1 - tx)),
+        (values[np.ix_(i1, j1)], ty * tx),
+    )
+    total = np.zeros((len(dst_lat), len(dst_lon)))
+    weight = np.zeros((len(dst_lat), len(dst_lon)))
+    for corner, w in corners:
+        finite = np.isfinite(corner)
+        w = np.where(finite, w, 0.0)
+        total += np.where(finite, corner, 0.0) * w
+        weight += w
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weight > 0, total / weight, np.nan)
+
+
+def get_environment_grid(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float, resolution: float
+) -> Dict[str, Any]:
+    """
+    Environment data on a regular grid covering a bounding box, for heatmaps.
+
+    OpenWeather is queried only on a coarse lattice (GRID_LATTICE_STEP_DEG),
+    and the values are bilinearly interpolated to a grid with `resolution`
+    degrees spacing. The response is array-encoded: each metric is a flat
+    row-major list (rows from south to north, columns from west to east),
+    described by the "grid" metadata. Missing values are null.
+
+    Raises GridUpstreamError when more than GRID_MAX_FAILED_SHARE of the
+    lattice nodes could not be fetched.
+    """
+    import numpy as np
+
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise ValueError("Invalid bbox: min values must be lower than max values")
+    if resolution <= 0:
+        raise ValueError("Resolution must be positive")
+
+    rows = int(math.floor((max_lat - min_lat) / resolution + 1e-9)) + 1
+    cols = int(math.floor((max_lon - min_lon) / resolution + 1e-9)) + 1
+    if rows * cols > GRID_MAX_CELLS:
+        raise ValueError(f"Grid too large: {rows * cols} cells (max {GRID_MAX_CELLS})")
+
+    # Keep the upstream budget fixed: the shorter axis is sized first (at most
+    # sqrt of the budget), the longer one gets what is left. The lattice is
+    # never denser than the requested grid itself.
+    short_max = math.isqrt(GRID_MAX_LATTICE_POINTS)
+    if max_lat - min_lat <= max_lon - min_lon:
+        lattice_lat = _lattice_axis(min_lat, max_lat, resolution, short_max)
+        lattice_lon = _lattice_axis(min_lon, max_lon, resolution, GRID_MAX_LATTICE_POINTS // len(lattice_lat))
+    else:
+        lattice_lon = _lattice_axis(min_lon, max_lon, resolution, short_max)
+        lattice_lat = _lattice_axis(min_lat, max_lat, resolution, GRID_MAX_LATTICE_POINTS // len(lattice_lon))
+    lattice_rows, lattice_cols = len(lattice_lat), len(lattice_lon)
+    assert lattice_rows * lattice_cols <= GRID_MAX_LATTICE_POINTS
+
+    nodes = [(float(la), float(lo)) for la in lattice_lat for lo in lattice_lon]
+
+    def fetch(node):
+        try:
+            return normalize_environment_data(node[0], node[1], include_raw=False)["metrics"]
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=GRID_FETCH_WORKERS) as pool:
+        samples = list(pool.map(fetch, nodes))
+
+    errors = [m for m in samples if isinstance(m, Exception)]
+    if len(errors) > GRID_MAX_FAILED_SHARE * len(nodes):
+        raise GridUpstreamError(
+            f"{len(errors)} of {len(nodes)} lattice nodes failed, e.g.: {errors[0]}"
+        )
+    samples = [{} if isinstance(m, Exception) else m for m in samples]
+
+    lattice = np.array(
+        [[m.get(key) if m.get(key) is not None else np.nan for key in GRID_METRICS] for m in samples],
+        dtype=float,
+    ).reshape(lattice_rows, lattice_cols, len(GRID_METRICS))
+
+    grid_lat = min_lat + np.arange(rows) * resolution
+    grid_lon = min_lon + np.arange(cols) * resolution
+
+    metrics: Dict[str, List[Any]] = {}
+    for k, key in enumerate(GRID_METRICS):
+        grid = _bilinear(lattice[:, :, k], lattice_lat, lattice_lon, grid_lat, grid_lon)
+        if key == "aqi":
+            # AQI is a 1–5 index, so interpolated values are rounded back to it
+            flat = np.round(grid).ravel().tolist()
+            metrics[key] = [None if math.isnan(v) else int(v) for v in flat]
+        else:
+            flat = np.round(grid, 2).ravel().tolist()
+            metrics[key] = [None if math.isnan(v) else v for v in flat]
+
+    return {
+        "category": "environment",
+        "source": "openweather",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "grid": {
+            "min_lat": min_lat,
+            "min_lon": min_lon,
+            "max_lat": max_lat,
+            "max_lon": max_lon,
+            "resolution": resolution,
+            "rows": rows,
+            "cols": cols,
+            "order": "row-major, rows south to north, columns west to east",
+        },
+        "sampling": {
+            "rows": lattice_rows,
+            "cols": lattice_cols,
+            "lat_step": round(float(lattice_lat[1] - lattice_lat[0]), 6),
+            "lon_step": round(float(lattice_lon[1] - lattice_lon[0]), 6),
+            "upstream_points": len(nodes),
+            "failed_points": len(errors),
+        },
+        "metrics": metrics,
+    }